@@ -1,485 +1,727 @@
-# main.py
-import time  # New import for sleep
-import json
-import random
-import os
-from datetime import datetime, timedelta
-import difflib
-
-
-import streamlit as st
-import pandas as pd
-
-
-# === Try to import gTTS; if missing, disable audio ===
-try:
-    from gtts import gTTS
-    TTS_AVAILABLE = True
-except ImportError:
-    TTS_AVAILABLE = False
-
-# === Page Configuration ===
-st.set_page_config(
-    page_title="Public Policy Flashcards & Smart Scheduler",
-    layout="centered",
-    initial_sidebar_state="expanded",
-)
-
-# === Paths for persistence ===
-TERMS_PATH = "terms.json"
-PROGRESS_PATH = "progress.json"
-AUDIO_DIR = "audio_tts"
-
-
-if TTS_AVAILABLE:
-    os.makedirs(AUDIO_DIR, exist_ok=True)
-
-# === Load Terms with Debugging Inside Function ===
-@st.cache_data
-def load_terms():
-    # 1. Ensure the file exists
-    if not os.path.exists(TERMS_PATH):
-        st.sidebar.error("⚠️ terms.json not found! Please ensure 'terms.json' exists.")
-        return []
-
-    # 2. Load JSON array of term objects
-    with open(TERMS_PATH, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # 3. Debug: Print first five term→author pairs
-    st.sidebar.markdown("### Loaded Authors Debug")
-    for idx, e in enumerate(data[:5]):
-        author_name = e.get("author", "❌ missing author")
-        st.sidebar.write(f"{idx+1}. {e.get('term','<no term>')} → {author_name}")
-
-    return data
-
-terms_list = load_terms()
-df = pd.DataFrame(terms_list)
-
-# === Load Progress (Known and Scheduler Data) ===
-def load_progress():
-    if os.path.exists(PROGRESS_PATH):
-        with open(PROGRESS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    else:
-        return {"known_terms": [], "scheduler": {}}
-
-def save_progress(data):
-    with open(PROGRESS_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f)
-
-progress_data = load_progress()
-known_terms = set(progress_data.get("known_terms", []))
-scheduler = progress_data.get("scheduler", {})
-
-# === Helper: SM-2 Spaced Repetition Scheduling ===
-def schedule_next(term, quality):
-    """
-    Simplified SM-2 scheduling:
-    quality: 0 (forgot) to 5 (perfect)
-    """
-    entry = scheduler.get(term, {"interval": 0, "repetitions": 0, "ef": 2.5})
-    interval = entry["interval"]
-    repetitions = entry["repetitions"]
-    ef = entry["ef"]
-
-    if quality < 3:
-        repetitions = 0
-        interval = 1
-    else:
-        ef = max(1.3, ef + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)))
-        repetitions += 1
-        if repetitions == 1:
-            interval = 1
-        elif repetitions == 2:
-            interval = 6
-        else:
-            interval = int(interval * ef)
-
-    next_due = (datetime.now() + timedelta(days=interval)).isoformat()
-    scheduler[term] = {"interval": interval, "repetitions": repetitions, "ef": ef, "next_due": next_due}
-    progress_data["scheduler"] = scheduler
-    save_progress(progress_data)
-
-# === Audio Pronunciation (only if gTTS available) ===
-def get_audio_path(term):
-    safe_name = term.replace(" ", "_").replace("/", "_")
-    return os.path.join(AUDIO_DIR, f"{safe_name}.mp3")
-
-def ensure_audio(term):
-    if not TTS_AVAILABLE:
-        return None
-    path = get_audio_path(term)
-    if not os.path.exists(path):
-        try:
-            tts = gTTS(text=term, lang="en")
-            tts.save(path)
-        except Exception:
-            return None
-    return path
-
-# === Sidebar: Reset Buttons ===
-st.sidebar.markdown("---")
-st.sidebar.subheader("⚙️ Reset Options")
-if st.sidebar.button("🔄 Reset Quiz Counters"):
-    st.session_state.quiz_correct_count = 0
-    st.session_state.quiz_total_asked = 0
-    st.sidebar.success("🔁 Quiz counters reset.")
-
-if st.sidebar.button("🗑️ Clear All Progress"):
-    known_terms.clear()
-    scheduler.clear()
-    progress_data["known_terms"] = []
-    progress_data["scheduler"] = {}
-    save_progress(progress_data)
-    st.session_state.quiz_correct_count = 0
-    st.session_state.quiz_total_asked = 0
-    st.sidebar.success("🗑️ All progress wiped.")
-
-
-# === Sidebar: Pomodoro Tracker (Manual Refresh) ===
-st.sidebar.markdown("---")
-st.sidebar.subheader("⏲️ Pomodoro Tracker (Manual Refresh)")
-
-# 1) Initialize or reset pomodoro_end in session_state if missing
-if "pomodoro_end" not in st.session_state:
-    st.session_state.pomodoro_end = None
-
-# 2) Button to start a new 25-minute Pomodoro
-if st.sidebar.button("▶️ Start 25-min Pomodoro"):
-    st.session_state.pomodoro_end = datetime.now() + timedelta(minutes=25)
-
-# 3) Button to stop the Pomodoro early
-if st.sidebar.button("⏹️ Stop Pomodoro"):
-    st.session_state.pomodoro_end = None
-
-# 4) If pomodoro_end is set, show remaining time (or “Done”)
-if st.session_state.pomodoro_end:
-    remaining_secs = (st.session_state.pomodoro_end - datetime.now()).total_seconds()
-
-    if remaining_secs <= 0:
-        st.sidebar.success("✅ Pomodoro done! Take a 5-min break.")
-        st.session_state.pomodoro_end = None
-    else:
-        mins, secs = divmod(int(remaining_secs), 60)
-        st.sidebar.write(f"Time left: {mins:02d}:{secs:02d}")
-
-        # 5) A manual “Refresh” button to recalculate and redraw the timer
-        if st.sidebar.button("🔄 Refresh Timer"):
-            # Re-run the script (nothing else needed; Streamlit will redraw)
-            pass  # nothing here — clicking will simply rerun the script
-
-# 6) If no Pomodoro is running, show a hint
-else:
-    st.sidebar.write("No Pomodoro running. Click ▶️ to start.")
-
-# === Sidebar: Tag/Topic Filtering ===
-st.sidebar.markdown("---")
-st.sidebar.subheader("🏷️ Filter by Tags")
-# Collect all unique tags from terms_list
-all_tags = set()
-for entry in terms_list:
-    tags = entry.get("tags", [])
-    for t in tags:
-        all_tags.add(t)
-all_tags = sorted(all_tags)
-
-selected_tags = st.sidebar.multiselect("Select Tags", options=all_tags)
-if selected_tags:
-    filtered_tags_terms = [e for e in terms_list if set(e.get("tags", [])) & set(selected_tags)]
-else:
-    filtered_tags_terms = terms_list.copy()
-
-# === Sidebar: Progress & Filters (after reset, pomodoro, tags) ===
-st.sidebar.markdown("---")
-st.sidebar.header("📊 Progress & Filters")
-
-# Known terms count and progress bar
-known_count = len(known_terms)
-total_terms = len(terms_list)
-st.sidebar.metric(label="✅ Known", value=f"{known_count}/{total_terms}")
-st.sidebar.progress(known_count / total_terms if total_terms > 0 else 0)
-
-# Export known terms as CSV
-if known_terms:
-    df_known = pd.DataFrame([{"term": t} for t in sorted(known_terms)])
-    csv_data = df_known.to_csv(index=False).encode("utf-8")
-    st.sidebar.download_button(
-        label="📥 Download Known Terms CSV",
-        data=csv_data,
-        file_name="known_terms.csv",
-        mime="text/csv",
-    )
-
-# Week Filter
-st.sidebar.markdown("---")
-st.sidebar.subheader("Filter by Week")
-all_weeks = sorted({entry.get("week", 0) for entry in terms_list})
-week_options = ["All"] + [str(w) for w in all_weeks]
-selected_week = st.sidebar.selectbox("Select Week", week_options)
-
-# Start with tag‐filtered terms; apply week filter next
-if selected_week == "All":
-    week_filtered = filtered_tags_terms.copy()
-else:
-    w = int(selected_week)
-    week_filtered = [e for e in filtered_tags_terms if e.get("week") == w]
-
-# Scheduler Filter: show only due terms
-st.sidebar.markdown("---")
-due_only = st.sidebar.checkbox("Show Only Due Terms", value=False)
-if due_only:
-    now_iso = datetime.now().isoformat()
-    filtered_terms = [
-        e for e in week_filtered
-        if scheduler.get(e["term"], {}).get("next_due", "") <= now_iso
-    ]
-else:
-    filtered_terms = week_filtered.copy()
-
-# === Main Title ===
-st.title("📚 Public Policy Flashcards & Smart Scheduler")
-st.markdown(
-    "Use the sidebar to filter by tags and weeks, track known terms, and see which are due for review.  \n"
-    "You can also start a Pomodoro, reset progress.  \n"
-    "Choose a mode below: Flashcard Lookup or Quick Quiz."
-)
-st.markdown("---")
-import unicodedata
-
-st.markdown("---")
-
-# === Initialize Quick Quiz Session State ===
-if "quiz_current_term" not in st.session_state:
-    st.session_state.quiz_current_term = None
-if "quiz_correct_count" not in st.session_state:
-    st.session_state.quiz_correct_count = 0
-if "quiz_total_asked" not in st.session_state:
-    st.session_state.quiz_total_asked = 0
-if "quiz_checked" not in st.session_state:
-    st.session_state.quiz_checked = False
-if "quiz_ratio" not in st.session_state:
-    st.session_state.quiz_ratio = 0.0
-
-# === Mode Selector ===
-mode = st.radio(
-    "Choose a study mode:",
-    ("Flashcard Lookup", "Quick Quiz"),
-    horizontal=True
-)
-
-# === 1) Flashcard Lookup Mode ===
-if mode == "Flashcard Lookup":
-    st.subheader("🔍 Flashcard Lookup")
-
-    available_terms = sorted([e["term"] for e in filtered_terms])
-    # You can also add a live search here if you want. For now, a simple selectbox:
-    choice = st.selectbox("▸ Pick a term to study:", [""] + available_terms)
-
-    if choice:
-        entry = next((e for e in filtered_terms if e["term"] == choice), None)
-        if entry:
-            # Flashcard Flip
-            if "show_definition_for" not in st.session_state:
-                st.session_state.show_definition_for = None
-
-            if st.session_state.show_definition_for != choice:
-                st.markdown(f"### **{entry['term']}**")
-
-                c1, c2, c3 = st.columns(3)
-                with c1:
-                    if entry.get("hint"):
-                        if st.button("💡 Show Hint"):
-                            st.session_state.show_definition_for = f"HINT::{choice}"
-                with c2:
-                    if st.button("🔄 Show Definition"):
-                        st.session_state.show_definition_for = choice
-                with c3:
-                    author_name = entry.get("author", "Unknown")
-                    if st.button("👤 Show Author"):
-                        st.info(f"**Author:** {author_name}")
-
-            if st.session_state.show_definition_for in (choice, f"HINT::{choice}"):
-                st.markdown(f"### **{entry['term']}**")
-
-                # If hint-only was clicked
-                if st.session_state.show_definition_for == f"HINT::{choice}":
-                    st.info(f"**Hint:** {entry['hint']}")
-                    if st.button("🔄 Now Show Definition"):
-                        st.session_state.show_definition_for = choice
-
-                if st.session_state.show_definition_for == choice:
-                    st.markdown(f"**Definition:**  \n{entry['definition']}")
-
-                    # Multimedia: image
-                    if entry.get("image_url"):
-                        try:
-                            st.image(entry["image_url"], caption="Illustration", use_column_width=True)
-                        except:
-                            st.warning("⚠️ Could not load image.")
-
-                    # Multimedia: example link
-                    if entry.get("example_link"):
-                        st.markdown(f"[🔗 View Example]({entry['example_link']})")
-
-                    # Audio pronunciation (if available)
-                    audio_path = ensure_audio(entry["term"])
-                    if audio_path:
-                        try:
-                            audio_bytes = open(audio_path, "rb").read()
-                            st.audio(audio_bytes, format="audio/mp3")
-                        except:
-                            pass  # skip audio if something goes wrong
-
-                    # Related terms
-                    if entry.get("related_terms"):
-                        related = entry["related_terms"]
-                        if related:
-                            st.markdown("**Related Terms:** " + ", ".join(f"• {r}" for r in related))
-
-                    # Mark Known/Unknown and schedule next review
-                    st.markdown("---")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button("✅ Mark as Known", key=f"known_{choice}"):
-                            known_terms.add(choice)
-                            progress_data["known_terms"] = list(known_terms)
-                            save_progress(progress_data)
-                    with col2:
-                        if st.button("❌ Mark as Unknown", key=f"unknown_{choice}"):
-                            known_terms.discard(choice)
-                            progress_data["known_terms"] = list(known_terms)
-                            save_progress(progress_data)
-
-                    # Spaced Repetition: Quality slider
-                    st.markdown("---")
-                    st.markdown("**🔁 Rate Your Recall**")
-                    quality = st.slider(
-                        "0 = forgot completely, 5 = perfect recall",
-                        min_value=0, max_value=5, value=3, key=f"slider_{choice}"
-                    )
-                    if st.button("Set Next Review", key=f"schedule_{choice}"):
-                        schedule_next(choice, quality)
-                        st.success("Next review date scheduled.")
-
-
-# === 2) Quick Quiz Mode ===
-else:
-    st.subheader("📝 Quick Quiz Mode")
-    st.markdown(
-        "Click “Next Random Term” to get a term. Type your answer, ask for a hint if needed, "
-        "then check your answer. You’ll see a similarity score and can mark Partial Correct. "
-        "You can also show the author."
-    )
-
-    # (1) The original “Next Random Term” button at the top:
-    if st.button("🔀 Next Random Term"):
-        if filtered_terms:
-            st.session_state.quiz_current_term = random.choice(filtered_terms)
-            st.session_state.quiz_total_asked += 1
-            st.session_state.quiz_checked = False
-            st.session_state.quiz_ratio = 0.0
-        else:
-            st.warning("No terms available under these filters.")
-
-    # (2) If there is a current term, show it:
-    if st.session_state.quiz_current_term:
-        term_obj = st.session_state.quiz_current_term
-        st.markdown(f"### **What is:** `{term_obj['term']}`?")
-        user_answer = st.text_area("Type your definition here:", height=100, key="user_answer")
-
-        # Buttons: Hint / Show Author / Check Answer
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            if term_obj.get("hint"):
-                if st.button("💡 Show Hint", key=f"quiz_hint_{term_obj['term']}"):
-                    st.info(f"**Hint:** {term_obj['hint']}")
-        with c2:
-            author_name = term_obj.get("author", "Unknown")
-            if st.button("👤 Show Author", key=f"quiz_author_{term_obj['term']}"):
-                st.info(f"**Author:** {author_name}")
-        with c3:
-            if st.button("✔️ Check My Answer", key=f"check_{term_obj['term']}"):
-                correct_def = term_obj["definition"].lower().strip()
-                user_ans_norm = user_answer.lower().strip()
-                ratio = difflib.SequenceMatcher(None, user_ans_norm, correct_def).ratio()
-                st.session_state.quiz_ratio = ratio
-                st.session_state.quiz_checked = True
-
-                pct = int(ratio * 100)
-                if ratio >= 0.8:
-                    st.success(f"✅ Your answer is {pct}% similar to the official definition → Correct!")
-                elif ratio >= 0.4:
-                    st.info(f"➗ Your answer is {pct}% similar → Partially correct.")
-                else:
-                    st.error(f"❌ Your answer is only {pct}% similar → Incorrect or incomplete.")
-
-        # (3) After checking, show definition and classification buttons
-        if st.session_state.quiz_checked:
-            st.markdown("---")
-            st.markdown(f"**Correct definition:**  \n\n{term_obj['definition']}")
-            if term_obj.get("image_url"):
-                try:
-                    st.image(term_obj["image_url"], caption="Illustration", use_column_width=True)
-                except:
-                    st.warning("⚠️ Could not load image.")
-            if term_obj.get("example_link"):
-                st.markdown(f"[🔗 View Example]({term_obj['example_link']})")
-
-            # Audio pronunciation
-            audio_path = ensure_audio(term_obj["term"]) if TTS_AVAILABLE else None
-            if audio_path:
-                try:
-                    audio_bytes = open(audio_path, "rb").read()
-                    st.audio(audio_bytes, format="audio/mp3")
-                except:
-                    pass
-
-            # Related terms
-            if term_obj.get("related_terms"):
-                rel = term_obj["related_terms"]
-                if rel:
-                    st.markdown("**Related Terms:** " + ", ".join(f"• {r}" for r in rel))
-
-            # Classification buttons (Fully / Partial / Incorrect)
-            st.markdown("---")
-            st.markdown("**How would you classify your answer?**")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                if st.button("✅ Fully Correct", key=f"correct_{term_obj['term']}"):
-                    st.session_state.quiz_correct_count += 1
-                    schedule_next(term_obj["term"], 5)
-                    # clear current term so classification UI goes away
-                    st.session_state.quiz_current_term = None
-            with col2:
-                if st.button("➗ Partially Correct", key=f"partial_{term_obj['term']}"):
-                    schedule_next(term_obj["term"], 3)
-                    st.session_state.quiz_current_term = None
-            with col3:
-                if st.button("❌ Incorrect", key=f"wrong_{term_obj['term']}"):
-                    schedule_next(term_obj["term"], 0)
-                    st.session_state.quiz_current_term = None
-
-            # ─── NEW: Next Button After Classification ────────────────────────────────
-            st.markdown("---")
-            if st.button("🔀 Next Random Term", key="next_after_classification"):
-                if filtered_terms:
-                    st.session_state.quiz_current_term = random.choice(filtered_terms)
-                    st.session_state.quiz_total_asked += 1
-                    st.session_state.quiz_checked = False
-                    st.session_state.quiz_ratio = 0.0
-                else:
-                    st.warning("No terms available under these filters.")
-            # ────────────────────────────────────────────────────────────────────────────
-
-    # (4) Quiz Score Display
-    st.markdown("---")
-    score = st.session_state.get("quiz_correct_count", 0)
-    asked = st.session_state.get("quiz_total_asked", 0)
-    percentage = (score / asked * 100) if asked > 0 else 0
-    st.metric(label="Score (Correct / Asked)", value=f"{score}/{asked}", delta=f"{percentage:.1f}%")
-
-
-st.markdown("---")
-st.caption("🔑 Your progress (known terms & next review dates) is saved locally. Keep practicing! 🚀")
+# main.py
+import time  # New import for sleep
+import atexit
+import functools
+import importlib.util
+import json
+import math
+import random
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import difflib
+import unicodedata
+
+
+import numpy as np
+import streamlit as st
+import streamlit.components.v1 as components
+
+
+# === Feature flags for optional deps; the heavy imports themselves are
+# === deferred to first use (sys.modules makes repeat imports free)
+TTS_AVAILABLE = importlib.util.find_spec("gtts") is not None
+PDF_AVAILABLE = importlib.util.find_spec("fpdf") is not None
+
+# === Try to import orjson (C extension); fall back to stdlib json ===
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# === Try to import RapidFuzz (C extension); fall back to difflib ===
+try:
+    from rapidfuzz import fuzz
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+def answer_similarity(user_answer, correct_def):
+    """Similarity ratio in [0, 1]; RapidFuzz when installed, difflib otherwise."""
+    if RAPIDFUZZ_AVAILABLE:
+        return fuzz.ratio(user_answer, correct_def) / 100.0
+    return difflib.SequenceMatcher(None, user_answer, correct_def).ratio()
+
+# st.fragment (Streamlit >= 1.33) scopes a widget event inside the decorated
+# function to re-running just that function instead of the whole script; on
+# older versions fall back to plain full-script reruns
+_fragment = getattr(st, "fragment", lambda f: f)
+
+# === Page Configuration ===
+st.set_page_config(
+    page_title="Public Policy Flashcards & Smart Scheduler",
+    layout="centered",
+    initial_sidebar_state="expanded",
+)
+
+# === Paths for persistence ===
+TERMS_PATH = "terms.json"
+PROGRESS_PATH = "progress.json"
+AUDIO_DIR = "audio_tts"
+
+
+if TTS_AVAILABLE:
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+
+# === Load Terms (cached once per session, pre-indexed) ===
+@st.cache_resource
+def load_terms():
+    """
+    Load terms.json once and pre-index it so reruns do O(1) dict lookups
+    instead of O(N) scans. Returns:
+      (terms_tuple, terms_by_name, terms_by_week, tag_to_idxs)
+    """
+    # 1. Ensure the file exists
+    if not os.path.exists(TERMS_PATH):
+        return (), {}, {}, {}
+
+    # 2. Load JSON array of term objects
+    with open(TERMS_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    # 3. Build the indices once; cache_resource keeps them shared (no copy per hit)
+    terms = tuple(data)
+    # Intern the term names (constant for the session) and precompute the
+    # widget key strings once, instead of f-string formatting per rerun
+    for e in terms:
+        e["term"] = sys.intern(e["term"])
+        e["_keys"] = {
+            kind: kind + "_" + e["term"]
+            for kind in (
+                "known", "unknown", "slider", "schedule",
+                "quiz_hint", "quiz_author", "check",
+                "correct", "partial", "wrong",
+            )
+        }
+    terms_by_name = {e["term"]: e for e in terms}
+    week_to_idxs = defaultdict(set)
+    tag_to_idxs = defaultdict(set)
+    for idx, e in enumerate(terms):
+        week_to_idxs[e.get("week", 0)].add(idx)
+        for t in e.get("tags", []):
+            tag_to_idxs[t].add(idx)
+
+    return terms, terms_by_name, dict(week_to_idxs), dict(tag_to_idxs)
+
+terms_list, terms_by_name, week_to_idxs, tag_to_idxs = load_terms()
+if not terms_list:
+    st.sidebar.error("⚠️ terms.json not found! Please ensure 'terms.json' exists.")
+
+# Debug: Print first five term→author pairs (only when debug flag is set)
+if st.session_state.get("debug"):
+    st.sidebar.markdown("### Loaded Authors Debug")
+    for idx, e in enumerate(terms_list[:5]):
+        author_name = e.get("author", "❌ missing author")
+        st.sidebar.write(f"{idx+1}. {e.get('term','<no term>')} → {author_name}")
+
+@st.cache_resource
+def get_term_arrays():
+    """
+    Columnar (SoA) views of the deck for vectorized filtering: parallel
+    NumPy arrays of term names and weeks, plus a boolean term-by-tag
+    matrix. Filters become single C-level passes over contiguous memory
+    instead of pointer-chasing through the list of dicts; the dicts are
+    only touched for the entries that survive the mask.
+    """
+    terms_arr = np.array([e["term"] for e in terms_list], dtype=object)
+    weeks_arr = np.array([e.get("week", 0) for e in terms_list], dtype=np.int16)
+    tag_cols = {t: i for i, t in enumerate(sorted(tag_to_idxs))}
+    tags_matrix = np.zeros((len(terms_list), len(tag_cols)), dtype=bool)
+    for tag, idxs in tag_to_idxs.items():
+        tags_matrix[list(idxs), tag_cols[tag]] = True
+    return terms_arr, weeks_arr, tags_matrix, tag_cols
+
+# === Load Progress (Known and Scheduler Data) ===
+def load_progress():
+    if os.path.exists(PROGRESS_PATH):
+        with open(PROGRESS_PATH, "rb") as f:
+            raw = f.read()
+        data = orjson.loads(raw) if ORJSON_AVAILABLE else json.loads(raw)
+        # Migrate legacy due dates (ISO strings, then epoch floats) to
+        # integer ordinal days — a single int compare in the due filter
+        for entry in data.get("scheduler", {}).values():
+            nd = entry.get("next_due")
+            if isinstance(nd, str):
+                entry["next_due"] = datetime.fromisoformat(nd).toordinal()
+            elif isinstance(nd, float):
+                entry["next_due"] = datetime.fromtimestamp(nd).toordinal()
+        return data
+    else:
+        return {"known_terms": [], "scheduler": {}}
+
+def save_progress(data):
+    # Write to a temp file then atomically swap it in, so a crash mid-write
+    # never truncates progress.json
+    tmp_path = PROGRESS_PATH + ".tmp"
+    raw = orjson.dumps(data) if ORJSON_AVAILABLE else json.dumps(data).encode("utf-8")
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+    os.replace(tmp_path, PROGRESS_PATH)
+
+def mark_progress_dirty():
+    """Defer persistence: mutations flag the state dirty and a single
+    flush at the end of the rerun writes them all out at once."""
+    st.session_state.progress_dirty = True
+
+# Progress lives in session state: the same dict/set objects survive every
+# rerun, so mutations only flag dirty and the known list is serialized once
+# at flush time instead of rebuilt on every click
+if "progress_data" not in st.session_state:
+    st.session_state.progress_data = load_progress()
+    st.session_state.known_terms = set(
+        st.session_state.progress_data.get("known_terms", [])
+    )
+progress_data = st.session_state.progress_data
+known_terms = st.session_state.known_terms
+scheduler = progress_data.setdefault("scheduler", {})
+
+def flush_progress():
+    progress_data["known_terms"] = list(known_terms)
+    save_progress(progress_data)
+
+# Safety net: also flush pending mutations when the server process exits
+if not st.session_state.get("flush_registered"):
+    atexit.register(flush_progress)
+    st.session_state.flush_registered = True
+
+# === Per-term due-date array, row-aligned with the SoA arrays: the due
+# === filter is a single vectorized int compare (0 = never reviewed = due)
+@st.cache_resource
+def get_term_index():
+    """Row number of each term in the SoA/due arrays."""
+    return {e["term"]: i for i, e in enumerate(terms_list)}
+
+if "next_due_arr" not in st.session_state:
+    arr = np.zeros(len(terms_list), dtype=np.int64)
+    for i, e in enumerate(terms_list):
+        arr[i] = scheduler.get(e["term"], {}).get("next_due", 0)
+    st.session_state.next_due_arr = arr
+next_due_arr = st.session_state.next_due_arr
+
+# === Helper: FSRS-lite Spaced Repetition Scheduling ===
+def schedule_next(term, quality):
+    """
+    FSRS-lite scheduling: each card carries a stability S (roughly, days
+    the memory survives at ~90% retention) and a difficulty D in [1, 10].
+    Successful reviews grow S the more the memory had decayed by review
+    time; lapses collapse S and raise D. Spacing adapts per card, so the
+    same retention needs fewer total reviews than fixed SM-2 steps.
+    quality: 0 (forgot) to 5 (perfect)
+    """
+    entry = scheduler.get(term, {"interval": 0, "repetitions": 0, "ef": 2.5})
+    interval = entry["interval"]
+    repetitions = entry["repetitions"]
+    ef = entry["ef"]
+    stability = entry.get("stability", 1.0)
+    difficulty = entry.get("difficulty", 5.0)
+
+    today = date.today().toordinal()
+
+    if quality < 3:
+        repetitions = 0
+        difficulty = min(10.0, difficulty + 1.0)
+        stability = max(1.0, stability * 0.4)
+        interval = 1
+    else:
+        repetitions += 1
+        # Easy answers lower difficulty, bare passes leave it unchanged
+        difficulty = min(10.0, max(1.0, difficulty - (quality - 3) * 0.4))
+        # Retrievability at review time: decays with days elapsed since the
+        # last review (reconstructed from the stored due date and interval)
+        elapsed = max(0, today - (entry.get("next_due", today) - interval))
+        retrievability = 1.0 / (1.0 + elapsed / (9.0 * stability))
+        growth = (
+            math.exp(0.25 * (11.0 - difficulty))
+            * stability ** -0.3
+            * (math.exp((1.0 - retrievability) * 1.2) - 1.0)
+        )
+        bonus = (1.0, 1.3, 1.6)[quality - 3]
+        stability *= 1.0 + growth * bonus
+        interval = max(1, round(stability))
+
+    next_due = today + interval
+    scheduler[term] = {
+        "interval": interval,
+        "repetitions": repetitions,
+        "ef": ef,
+        "stability": stability,
+        "difficulty": difficulty,
+        "next_due": next_due,
+    }
+    next_due_arr[get_term_index()[term]] = next_due
+    progress_data["scheduler"] = scheduler
+    mark_progress_dirty()
+
+# === Audio Pronunciation (only if gTTS available) ===
+def get_audio_path(term):
+    safe_name = term.replace(" ", "_").replace("/", "_")
+    return os.path.join(AUDIO_DIR, f"{safe_name}.mp3")
+
+def ensure_audio(term):
+    if not TTS_AVAILABLE:
+        return None
+    path = get_audio_path(term)
+    if not os.path.exists(path):
+        try:
+            from gtts import gTTS
+            tts = gTTS(text=term, lang="en")
+            tts.save(path)
+        except Exception:
+            return None
+    return path
+
+@st.cache_resource
+def prewarm_audio():
+    """Generate any missing term mp3s once per session, in parallel.
+
+    gTTS calls are network-bound, so threads overlap the HTTPS round-trips;
+    flashcard reveals then never block on audio generation.
+    """
+    if not TTS_AVAILABLE:
+        return False
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        list(ex.map(ensure_audio, (e["term"] for e in terms_list)))
+    return True
+
+prewarm_audio()
+
+@st.cache_resource
+def audio_bytes(term):
+    """mp3 bytes for a term, read from disk once and kept in memory."""
+    path = ensure_audio(term)
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+# === Sidebar: Reset Buttons ===
+st.sidebar.markdown("---")
+st.sidebar.subheader("⚙️ Reset Options")
+if st.sidebar.button("🔄 Reset Quiz Counters"):
+    st.session_state.quiz_correct_count = 0
+    st.session_state.quiz_total_asked = 0
+    st.sidebar.success("🔁 Quiz counters reset.")
+
+if st.sidebar.button("🗑️ Clear All Progress"):
+    known_terms.clear()
+    scheduler.clear()
+    next_due_arr[:] = 0
+    mark_progress_dirty()
+    st.session_state.quiz_correct_count = 0
+    st.session_state.quiz_total_asked = 0
+    st.sidebar.success("🗑️ All progress wiped.")
+
+
+# === Sidebar: Pomodoro Tracker (ticks in the browser) ===
+st.sidebar.markdown("---")
+st.sidebar.subheader("⏲️ Pomodoro Tracker")
+
+# 1) Initialize or reset pomodoro_end in session_state if missing
+if "pomodoro_end" not in st.session_state:
+    st.session_state.pomodoro_end = None
+
+# NOTE: not a fragment — fragments can't write widgets into containers
+# created outside them, and everything here renders via st.sidebar. The
+# countdown already ticks client-side, so only start/stop clicks rerun
+# the script and those have to update server state anyway.
+
+# 2) Button to start a new 25-minute Pomodoro
+if st.sidebar.button("▶️ Start 25-min Pomodoro"):
+    st.session_state.pomodoro_end = datetime.now() + timedelta(minutes=25)
+
+# 3) Button to stop the Pomodoro early
+if st.sidebar.button("⏹️ Stop Pomodoro"):
+    st.session_state.pomodoro_end = None
+
+# 4) If pomodoro_end is set, render a client-side countdown: the browser
+#    does the per-second ticking, so no Python rerun is needed to redraw
+if st.session_state.pomodoro_end:
+    remaining_secs = (st.session_state.pomodoro_end - datetime.now()).total_seconds()
+
+    if remaining_secs <= 0:
+        st.sidebar.success("✅ Pomodoro done! Take a 5-min break.")
+        st.session_state.pomodoro_end = None
+    else:
+        with st.sidebar:
+            components.html(
+                f"""
+                <div id="pomodoro" style="font-family: sans-serif; font-size: 16px;"></div>
+                <script>
+                  var end = Date.now() + {int(remaining_secs)} * 1000;
+                  function tick() {{
+                    var left = Math.max(0, Math.round((end - Date.now()) / 1000));
+                    var m = String(Math.floor(left / 60)).padStart(2, "0");
+                    var s = String(left % 60).padStart(2, "0");
+                    document.getElementById("pomodoro").textContent =
+                      left > 0 ? "Time left: " + m + ":" + s
+                               : "\\u2705 Pomodoro done! Take a 5-min break.";
+                  }}
+                  tick();
+                  setInterval(tick, 1000);
+                </script>
+                """,
+                height=40,
+            )
+
+# 5) If no Pomodoro is running, show a hint
+else:
+    st.sidebar.write("No Pomodoro running. Click ▶️ to start.")
+
+# === Sidebar: Tag/Topic Filtering ===
+st.sidebar.markdown("---")
+st.sidebar.subheader("🏷️ Filter by Tags")
+# Tag options come straight from the precomputed inverted index
+all_tags = sorted(tag_to_idxs)
+
+selected_tags = st.sidebar.multiselect("Select Tags", options=all_tags)
+
+# === Sidebar: Progress & Filters (after reset, pomodoro, tags) ===
+st.sidebar.markdown("---")
+st.sidebar.header("📊 Progress & Filters")
+
+# Known terms count and progress bar
+known_count = len(known_terms)
+total_terms = len(terms_list)
+st.sidebar.metric(label="✅ Known", value=f"{known_count}/{total_terms}")
+st.sidebar.progress(known_count / total_terms if total_terms > 0 else 0)
+
+# Export known terms as CSV
+@st.cache_data
+def known_csv(known_tuple):
+    """CSV bytes for the known-terms export. One column, so a plain join
+    replaces the pandas DataFrame round-trip; st.cache_data keys the
+    result on the tuple, so it's only rebuilt when the set changes."""
+    return ("term\n" + "\n".join(known_tuple) + "\n").encode("utf-8")
+
+if known_terms:
+    csv_data = known_csv(tuple(sorted(known_terms)))
+    st.sidebar.download_button(
+        label="📥 Download Known Terms CSV",
+        data=csv_data,
+        file_name="known_terms.csv",
+        mime="text/csv",
+    )
+
+@functools.lru_cache(maxsize=None)
+def pdf_safe(text):
+    """Latin-1-safe text for FPDF, cached — terms and definitions are
+    stable, so the NFKD+encode pipeline runs once per string ever."""
+    return (
+        unicodedata.normalize("NFKD", text)
+        .encode("latin-1", "ignore")
+        .decode("latin-1")
+    )
+
+# Export unknown terms as a printable PDF (built fully in memory — no
+# temp file written to disk and read back)
+if PDF_AVAILABLE:
+    unknown_terms = [e for e in terms_list if e["term"] not in known_terms]
+    if unknown_terms and st.sidebar.button("📄 Generate Unknown Terms PDF"):
+        from fpdf import FPDF
+        pdf = FPDF()
+        for e in unknown_terms:
+            pdf.add_page()
+            # One font switch and one ln per element — not 8 ln(10) calls
+            pdf.set_font("Arial", size=16)
+            pdf.cell(0, 10, pdf_safe(e["term"]), ln=1, align="C")
+            pdf.ln(80)
+            pdf.set_font("Arial", size=12)
+            pdf.multi_cell(0, 8, pdf_safe(e.get("definition", "")))
+        # fpdf2 returns a bytearray; classic fpdf returns a latin-1 str
+        out = pdf.output(dest="S")
+        st.session_state.pdf_bytes = (
+            out.encode("latin-1") if isinstance(out, str) else bytes(out)
+        )
+    if st.session_state.get("pdf_bytes"):
+        st.sidebar.download_button(
+            label="📄 Download Unknown Terms PDF",
+            data=st.session_state.pdf_bytes,
+            file_name="flashcards_unknown.pdf",
+            mime="application/pdf",
+        )
+
+# Week Filter
+st.sidebar.markdown("---")
+st.sidebar.subheader("Filter by Week")
+all_weeks = sorted(week_to_idxs)
+week_options = ["All"] + [str(w) for w in all_weeks]
+selected_week = st.sidebar.selectbox("Select Week", week_options)
+
+# Scheduler Filter: show only due terms
+st.sidebar.markdown("---")
+due_only = st.sidebar.checkbox("Show Only Due Terms", value=False)
+
+# === Apply all three filters as one vectorized boolean mask ===
+terms_arr, weeks_arr, tags_matrix, tag_cols = get_term_arrays()
+keep = np.ones(len(terms_arr), dtype=bool)
+if selected_tags:
+    keep &= tags_matrix[:, [tag_cols[t] for t in selected_tags]].any(axis=1)
+if selected_week != "All":
+    keep &= weeks_arr == int(selected_week)
+if due_only:
+    # One contiguous int compare; rows default to 0 (never reviewed = due)
+    keep &= next_due_arr <= date.today().toordinal()
+
+filtered_idx = np.flatnonzero(keep)
+filtered_terms = [terms_list[i] for i in filtered_idx]
+
+# === Main Title ===
+st.title("📚 Public Policy Flashcards & Smart Scheduler")
+st.markdown(
+    "Use the sidebar to filter by tags and weeks, track known terms, and see which are due for review.  \n"
+    "You can also start a Pomodoro, reset progress.  \n"
+    "Choose a mode below: Flashcard Lookup or Quick Quiz."
+)
+st.markdown("---")
+
+# === Initialize Quick Quiz Session State ===
+if "quiz_current_term" not in st.session_state:
+    st.session_state.quiz_current_term = None
+if "quiz_correct_count" not in st.session_state:
+    st.session_state.quiz_correct_count = 0
+if "quiz_total_asked" not in st.session_state:
+    st.session_state.quiz_total_asked = 0
+if "quiz_checked" not in st.session_state:
+    st.session_state.quiz_checked = False
+if "quiz_ratio" not in st.session_state:
+    st.session_state.quiz_ratio = 0.0
+if "rng" not in st.session_state:
+    # One RNG per session: no global-state reseeding, reproducible if seeded
+    st.session_state.rng = random.Random()
+
+@_fragment
+def quiz_panel():
+    st.subheader("📝 Quick Quiz Mode")
+    st.markdown(
+        "Click “Next Random Term” to get a term. Type your answer, ask for a hint if needed, "
+        "then check your answer. You’ll see a similarity score and can mark Partial Correct. "
+        "You can also show the author."
+    )
+
+    # (1) The original “Next Random Term” button at the top:
+    if st.button("🔀 Next Random Term"):
+        if len(filtered_idx):
+            # Sample an index, not the materialized list of dicts
+            pick = filtered_idx[st.session_state.rng.randrange(len(filtered_idx))]
+            st.session_state.quiz_current_term = terms_list[pick]
+            st.session_state.quiz_total_asked += 1
+            st.session_state.quiz_checked = False
+            st.session_state.quiz_ratio = 0.0
+        else:
+            st.warning("No terms available under these filters.")
+
+    # (2) If there is a current term, show it:
+    if st.session_state.quiz_current_term:
+        term_obj = st.session_state.quiz_current_term
+        st.markdown(f"### **What is:** `{term_obj['term']}`?")
+        user_answer = st.text_area("Type your definition here:", height=100, key="user_answer")
+
+        # Buttons: Hint / Show Author / Check Answer
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            if term_obj.get("hint"):
+                if st.button("💡 Show Hint", key=term_obj["_keys"]["quiz_hint"]):
+                    st.info(f"**Hint:** {term_obj['hint']}")
+        with c2:
+            author_name = term_obj.get("author", "Unknown")
+            if st.button("👤 Show Author", key=term_obj["_keys"]["quiz_author"]):
+                st.info(f"**Author:** {author_name}")
+        with c3:
+            if st.button("✔️ Check My Answer", key=term_obj["_keys"]["check"]):
+                correct_def = term_obj["definition"].lower().strip()
+                user_ans_norm = user_answer.lower().strip()
+                ratio = answer_similarity(user_ans_norm, correct_def)
+                st.session_state.quiz_ratio = ratio
+                st.session_state.quiz_checked = True
+
+                pct = int(ratio * 100)
+                if ratio >= 0.8:
+                    st.success(f"✅ Your answer is {pct}% similar to the official definition → Correct!")
+                elif ratio >= 0.4:
+                    st.info(f"➗ Your answer is {pct}% similar → Partially correct.")
+                else:
+                    st.error(f"❌ Your answer is only {pct}% similar → Incorrect or incomplete.")
+
+        # (3) After checking, show definition and classification buttons
+        if st.session_state.quiz_checked:
+            st.markdown("---")
+            st.markdown(f"**Correct definition:**  \n\n{term_obj['definition']}")
+            if term_obj.get("image_url"):
+                try:
+                    st.image(term_obj["image_url"], caption="Illustration", use_column_width=True)
+                except:
+                    st.warning("⚠️ Could not load image.")
+            if term_obj.get("example_link"):
+                st.markdown(f"[🔗 View Example]({term_obj['example_link']})")
+
+            # Audio pronunciation
+            mp3 = audio_bytes(term_obj["term"]) if TTS_AVAILABLE else None
+            if mp3:
+                st.audio(mp3, format="audio/mp3")
+
+            # Related terms
+            if term_obj.get("related_terms"):
+                rel = term_obj["related_terms"]
+                if rel:
+                    st.markdown("**Related Terms:** " + ", ".join(f"• {r}" for r in rel))
+
+            # Classification buttons (Fully / Partial / Incorrect)
+            st.markdown("---")
+            st.markdown("**How would you classify your answer?**")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                if st.button("✅ Fully Correct", key=term_obj["_keys"]["correct"]):
+                    st.session_state.quiz_correct_count += 1
+                    schedule_next(term_obj["term"], 5)
+                    # clear current term so classification UI goes away
+                    st.session_state.quiz_current_term = None
+            with col2:
+                if st.button("➗ Partially Correct", key=term_obj["_keys"]["partial"]):
+                    schedule_next(term_obj["term"], 3)
+                    st.session_state.quiz_current_term = None
+            with col3:
+                if st.button("❌ Incorrect", key=term_obj["_keys"]["wrong"]):
+                    schedule_next(term_obj["term"], 0)
+                    st.session_state.quiz_current_term = None
+
+            # ─── NEW: Next Button After Classification ────────────────────────────────
+            st.markdown("---")
+            if st.button("🔀 Next Random Term", key="next_after_classification"):
+                if len(filtered_idx):
+                    pick = filtered_idx[st.session_state.rng.randrange(len(filtered_idx))]
+                    st.session_state.quiz_current_term = terms_list[pick]
+                    st.session_state.quiz_total_asked += 1
+                    st.session_state.quiz_checked = False
+                    st.session_state.quiz_ratio = 0.0
+                else:
+                    st.warning("No terms available under these filters.")
+            # ────────────────────────────────────────────────────────────────────────────
+
+    # (4) Quiz Score Display
+    st.markdown("---")
+    score = st.session_state.get("quiz_correct_count", 0)
+    asked = st.session_state.get("quiz_total_asked", 0)
+    percentage = (score / asked * 100) if asked > 0 else 0
+    st.metric(label="Score (Correct / Asked)", value=f"{score}/{asked}", delta=f"{percentage:.1f}%")
+
+
+    # Fragment-scoped reruns skip the end-of-script flush, so any
+    # schedule_next writes made here are flushed before the fragment ends
+    if st.session_state.get("progress_dirty"):
+        flush_progress()
+        st.session_state.progress_dirty = False
+
+
+# === Mode Selector ===
+mode = st.radio(
+    "Choose a study mode:",
+    ("Flashcard Lookup", "Quick Quiz"),
+    horizontal=True
+)
+
+# === 1) Flashcard Lookup Mode ===
+if mode == "Flashcard Lookup":
+    st.subheader("🔍 Flashcard Lookup")
+
+    available_terms = sorted([e["term"] for e in filtered_terms])
+    # You can also add a live search here if you want. For now, a simple selectbox:
+    choice = st.selectbox("▸ Pick a term to study:", [""] + available_terms)
+
+    if choice:
+        entry = terms_by_name.get(choice)
+        if entry:
+            # Flashcard Flip
+            if "show_definition_for" not in st.session_state:
+                st.session_state.show_definition_for = None
+
+            if st.session_state.show_definition_for != choice:
+                st.markdown(f"### **{entry['term']}**")
+
+                c1, c2, c3 = st.columns(3)
+                with c1:
+                    if entry.get("hint"):
+                        if st.button("💡 Show Hint"):
+                            st.session_state.show_definition_for = f"HINT::{choice}"
+                with c2:
+                    if st.button("🔄 Show Definition"):
+                        st.session_state.show_definition_for = choice
+                with c3:
+                    author_name = entry.get("author", "Unknown")
+                    if st.button("👤 Show Author"):
+                        st.info(f"**Author:** {author_name}")
+
+            if st.session_state.show_definition_for in (choice, f"HINT::{choice}"):
+                st.markdown(f"### **{entry['term']}**")
+
+                # If hint-only was clicked
+                if st.session_state.show_definition_for == f"HINT::{choice}":
+                    st.info(f"**Hint:** {entry['hint']}")
+                    if st.button("🔄 Now Show Definition"):
+                        st.session_state.show_definition_for = choice
+
+                if st.session_state.show_definition_for == choice:
+                    st.markdown(f"**Definition:**  \n{entry['definition']}")
+
+                    # Multimedia: image
+                    if entry.get("image_url"):
+                        try:
+                            st.image(entry["image_url"], caption="Illustration", use_column_width=True)
+                        except:
+                            st.warning("⚠️ Could not load image.")
+
+                    # Multimedia: example link
+                    if entry.get("example_link"):
+                        st.markdown(f"[🔗 View Example]({entry['example_link']})")
+
+                    # Audio pronunciation (if available)
+                    mp3 = audio_bytes(entry["term"])
+                    if mp3:
+                        st.audio(mp3, format="audio/mp3")
+
+                    # Related terms
+                    if entry.get("related_terms"):
+                        related = entry["related_terms"]
+                        if related:
+                            st.markdown("**Related Terms:** " + ", ".join(f"• {r}" for r in related))
+
+                    # Mark Known/Unknown and schedule next review
+                    st.markdown("---")
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        if st.button("✅ Mark as Known", key=entry["_keys"]["known"]):
+                            known_terms.add(choice)
+                            mark_progress_dirty()
+                    with col2:
+                        if st.button("❌ Mark as Unknown", key=entry["_keys"]["unknown"]):
+                            known_terms.discard(choice)
+                            mark_progress_dirty()
+
+                    # Spaced Repetition: Quality slider
+                    st.markdown("---")
+                    st.markdown("**🔁 Rate Your Recall**")
+                    quality = st.slider(
+                        "0 = forgot completely, 5 = perfect recall",
+                        min_value=0, max_value=5, value=3, key=entry["_keys"]["slider"]
+                    )
+                    if st.button("Set Next Review", key=entry["_keys"]["schedule"]):
+                        schedule_next(choice, quality)
+                        st.success("Next review date scheduled.")
+
+
+# === 2) Quick Quiz Mode ===
+else:
+    quiz_panel()
+
+st.markdown("---")
+st.caption("🔑 Your progress (known terms & next review dates) is saved locally. Keep practicing! 🚀")
+
+# === Flush coalesced progress mutations (one write per rerun, not per click) ===
+if st.session_state.get("progress_dirty"):
+    flush_progress()
+    st.session_state.progress_dirty = False